@@ -1,5 +1,8 @@
+import asyncio
 import os
-from typing import cast, Dict, Optional
+from typing import cast, Dict, List, Tuple
+
+from pydantic import BaseModel
 
 from stripe2qbo.db.models import User
 from stripe2qbo.db.schemas import Settings, TransactionSync
@@ -37,18 +40,41 @@ class Stripe2QBO:
         self._qbo = await create_qbo(qbo_token)
 
         if self._qbo.using_sales_tax:
-            self._tax_codes[self._settings.default_tax_code_id] = (
-                await self._qbo.get_tax_code(self._settings.default_tax_code_id)
-                if self._settings.default_tax_code_id != "TAX"
-                else None
-            )
-            self._tax_codes[self._settings.exempt_tax_code_id] = (
-                await self._qbo.get_tax_code(self._settings.exempt_tax_code_id)
-                if self._settings.exempt_tax_code_id != "NON"
-                else None
-            )
+            try:
+                await self._load_tax_codes()
+            except Exception:
+                await self._qbo.close()
+                raise
         return None
 
+    async def _load_tax_codes(self) -> None:
+        default_tax_code_id = self._settings.default_tax_code_id
+        exempt_tax_code_id = self._settings.exempt_tax_code_id
+        self._tax_codes[default_tax_code_id] = None
+        self._tax_codes[exempt_tax_code_id] = None
+
+        # "TAX" and "NON" are placeholders rather than real QBO tax codes
+        tax_code_ids = [
+            tax_code_id
+            for tax_code_id, placeholder in (
+                (default_tax_code_id, "TAX"),
+                (exempt_tax_code_id, "NON"),
+            )
+            if tax_code_id != placeholder
+        ]
+        await self._qbo.hydrate(tax_code_ids=tax_code_ids)
+        for tax_code_id in tax_code_ids:
+            self._tax_codes[tax_code_id] = await self._qbo.get_tax_code(tax_code_id)
+
+    async def close(self) -> None:
+        await self._qbo.close()
+
+    async def _get_or_create_product(self, product_name: str) -> qbo_models.ItemRef:
+        income_account_id = await self._qbo.get_or_create_account(
+            product_name, "Income"
+        )
+        return await self._qbo.get_or_create_item(product_name, income_account_id)
+
     async def sync_invoice(
         self, stripe_invoice: stripe_models.Invoice, qbo_customer: qbo_models.Customer
     ):
@@ -69,48 +95,92 @@ class Stripe2QBO:
             exchange_rate=self._exchange_rate,
         )
 
+        # Resolve each distinct product once, concurrently. QBO names are
+        # case-insensitive, so names differing only in case share a product.
+        product_names: Dict[str, str] = {}
+        for line in qbo_invoice.Line:
+            product = line.SalesItemLineDetail.ItemRef
+            if product.value is None and product.name is not None:
+                product_names.setdefault(product.name.lower(), product.name)
+        names = list(product_names.values())
+        await self._qbo.hydrate(item_names=names, account_names=names)
+        products = await asyncio.gather(
+            *[self._get_or_create_product(name) for name in names]
+        )
+        items = dict(zip(product_names, products))
+
         for line in qbo_invoice.Line:
             product = line.SalesItemLineDetail.ItemRef
             if product.value is None and product.name is not None:
-                income_account_id = await self._qbo.get_or_create_account(
-                    product.name, "Income"
-                )
                 line.SalesItemLineDetail.ItemRef = cast(
-                    qbo_models.ProductItemRef,
-                    await self._qbo.get_or_create_item(
-                        product.name,
-                        income_account_id,
-                    ),
+                    qbo_models.ProductItemRef, items[product.name.lower()]
                 )
 
         invoice_id = await self._qbo.create_invoice(qbo_invoice)
         return invoice_id
 
-    async def sync_charge(
+    async def sync_charge_and_fee(
         self,
-        stripe_charge: stripe_models.Charge,
+        transaction: stripe_models.Transaction,
         qbo_customer: qbo_models.Customer,
-        qbo_invoice_id: Optional[str] = None,
-    ) -> str:
-        """Create a QBO Payment for a Stripe Charge"""
-        payment_id = await check_for_existing(
-            "Payment",
-            qbo_customer_id=qbo_customer.Id,
-            private_note=stripe_charge.id,
-            qbo=self._qbo,
+        sync_status: TransactionSync,
+    ) -> None:
+        """Create a QBO Payment and a QBO Expense for a Stripe charge Transaction.
+
+        Both are created in one batch request when neither exists yet. Their ids
+        are recorded on sync_status before any error is raised, so a Payment
+        that was created is kept even if the Expense fails."""
+        stripe_charge = cast(stripe_models.Charge, transaction.charge)
+        sync_status.payment_id, sync_status.expense_id = await asyncio.gather(
+            check_for_existing(
+                "Payment",
+                qbo_customer_id=qbo_customer.Id,
+                private_note=stripe_charge.id,
+                qbo=self._qbo,
+            ),
+            check_for_existing(
+                "Purchase",
+                private_note=transaction.id,
+                qbo=self._qbo,
+            ),
         )
-        if payment_id:
-            return payment_id
 
-        payment = payment_from_charge(
-            stripe_charge,
-            qbo_customer.Id,
-            self._settings,
-            invoice_id=qbo_invoice_id,
-            exchange_rate=self._exchange_rate,
+        to_create: List[Tuple[str, BaseModel]] = []
+        if sync_status.payment_id is None:
+            payment = payment_from_charge(
+                stripe_charge,
+                qbo_customer.Id,
+                self._settings,
+                invoice_id=sync_status.invoice_id,
+                exchange_rate=self._exchange_rate,
+            )
+            to_create.append(("Payment", payment))
+        if sync_status.expense_id is None:
+            expense = expense_from_transaction(transaction, self._settings)
+            to_create.append(("Purchase", expense))
+
+        # QBO entity type -> created id, or the error QBO returned for it
+        results = dict(
+            zip(
+                [entity_type for entity_type, _ in to_create],
+                await self._qbo.batch_create(to_create),
+            )
         )
-        payment_id = await self._qbo.create_payment(payment)
-        return payment_id
+
+        errors: List[QBOException] = []
+        payment_result = results.get("Payment")
+        if isinstance(payment_result, QBOException):
+            errors.append(payment_result)
+        elif payment_result is not None:
+            sync_status.payment_id = payment_result
+        expense_result = results.get("Purchase")
+        if isinstance(expense_result, QBOException):
+            errors.append(expense_result)
+        elif expense_result is not None:
+            sync_status.expense_id = expense_result
+
+        if len(errors) > 0:
+            raise QBOException("; ".join(str(error) for error in errors))
 
     async def sync_stripe_fee(self, transaction: stripe_models.Transaction) -> str:
         """Create a QBO Expense for a Stripe Transaction"""
@@ -202,10 +272,7 @@ class Stripe2QBO:
                 )
 
             if transaction.charge:
-                sync_status.payment_id = await self.sync_charge(
-                    transaction.charge, qbo_customer, sync_status.invoice_id
-                )
-                sync_status.expense_id = await self.sync_stripe_fee(transaction)
+                await self.sync_charge_and_fee(transaction, qbo_customer, sync_status)
 
             if transaction.payout:
                 sync_status.transfer_id = await self.sync_payout(transaction.payout)
@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, HTTPException
 
 from stripe2qbo.qbo.models import CompanyInfo
-from stripe2qbo.qbo.qbo_request import qbo_request
+from stripe2qbo.qbo.qbo_request import qbo_client, qbo_request
 from stripe2qbo.qbo.auth import (
     Token,
     generate_auth_token,
@@ -70,54 +70,58 @@ def disconnect_qbo(
 @router.get("/info")
 async def get_qbo_info(token: Annotated[Token, Depends(get_qbo_token)]) -> CompanyInfo:
     try:
-        response = await qbo_request(
-            f"/companyinfo/{token.realm_id}",
-            access_token=token.access_token,
-            realm_id=token.realm_id,
-        )
+        async with qbo_client(token.access_token) as client:
+            data = await qbo_request(
+                f"/companyinfo/{token.realm_id}",
+                realm_id=token.realm_id,
+                client=client,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error making request: {e}")
 
-    return CompanyInfo(**response.json()["CompanyInfo"])
+    return CompanyInfo(**data["CompanyInfo"])
 
 
 @router.get("/accounts")
 async def get_qbo_accounts(token: Annotated[Token, Depends(get_qbo_token)]):
     try:
-        response = await qbo_request(
-            "/query?query=select * from Account MAXRESULTS 1000",
-            access_token=token.access_token,
-            realm_id=token.realm_id,
-        )
+        async with qbo_client(token.access_token) as client:
+            data = await qbo_request(
+                "/query?query=select * from Account MAXRESULTS 1000",
+                realm_id=token.realm_id,
+                client=client,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error making request: {e}")
 
-    return response.json()["QueryResponse"].get("Account", [])
+    return data["QueryResponse"].get("Account", [])
 
 
 @router.get("/vendors")
 async def get_qbo_vendors(token: Annotated[Token, Depends(get_qbo_token)]):
     try:
-        response = await qbo_request(
-            "/query?query=select * from Vendor MAXRESULTS 1000",
-            access_token=token.access_token,
-            realm_id=token.realm_id,
-        )
+        async with qbo_client(token.access_token) as client:
+            data = await qbo_request(
+                "/query?query=select * from Vendor MAXRESULTS 1000",
+                realm_id=token.realm_id,
+                client=client,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error making request: {e}")
 
-    return response.json()["QueryResponse"].get("Vendor", [])
+    return data["QueryResponse"].get("Vendor", [])
 
 
 @router.get("/taxcodes")
 async def get_qbo_taxcodes(token: Annotated[Token, Depends(get_qbo_token)]):
     try:
-        response = await qbo_request(
-            "/query?query=select * from TaxCode MAXRESULTS 1000",
-            access_token=token.access_token,
-            realm_id=token.realm_id,
-        )
+        async with qbo_client(token.access_token) as client:
+            data = await qbo_request(
+                "/query?query=select * from TaxCode MAXRESULTS 1000",
+                realm_id=token.realm_id,
+                client=client,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error making request: {e}")
 
-    return response.json()["QueryResponse"].get("TaxCode", [])
+    return data["QueryResponse"].get("TaxCode", [])
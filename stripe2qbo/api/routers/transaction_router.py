@@ -2,6 +2,7 @@ from typing import Annotated, List
 
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import TypeAdapter
 from stripe2qbo.api.auth import get_current_user_from_token
 
 from stripe2qbo.api.dependencies import get_db
@@ -14,6 +15,8 @@ router = APIRouter(
     tags=["transaction"],
 )
 
+_TRANSACTION_LIST_ADAPTER = TypeAdapter(List[TransactionSync])
+
 
 @router.get("/")
 def get_all_transactions(
@@ -23,10 +26,7 @@ def get_all_transactions(
     transactions = (
         db.query(TransactionSyncORM).filter(TransactionSyncORM.user_id == user.id).all()
     )
-    return [
-        TransactionSync.model_validate(tsx, from_attributes=True)
-        for tsx in transactions
-    ]
+    return _TRANSACTION_LIST_ADAPTER.validate_python(transactions, from_attributes=True)
 
 
 @router.get("/{transaction_id}")
@@ -1,10 +1,12 @@
+from functools import lru_cache
 from typing import Optional, Literal
 from pydantic import BaseModel
 
 
+@lru_cache(maxsize=None)
 def _snake_to_camel(s: str) -> str:
-    words = s.split("_")
-    return words[0] + "".join(word.capitalize() for word in words[1:])
+    head, _, tail = s.partition("_")
+    return head + "".join(word.capitalize() for word in tail.split("_"))
 
 
 class User(BaseModel):
@@ -29,6 +31,7 @@ class Settings(BaseModel):
         "alias_generator": _snake_to_camel,
         "populate_by_name": True,
         "from_attributes": True,
+        "frozen": True,
     }
 
 
@@ -1,9 +1,14 @@
-from typing import Any, Optional, Mapping
+import asyncio
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Mapping, Sequence, Tuple
+from urllib.parse import quote
 
-from httpx import Response
+from httpx import AsyncClient
+from pydantic import BaseModel
 
+from stripe2qbo.exceptions import QBOException
 from stripe2qbo.qbo.auth import Token
-from stripe2qbo.qbo.qbo_request import qbo_request
+from stripe2qbo.qbo.qbo_request import qbo_client, qbo_request
 from stripe2qbo.qbo.models import (
     Customer,
     Expense,
@@ -15,49 +20,127 @@ from stripe2qbo.qbo.models import (
     Transfer,
 )
 
+# QBO throttles each realm to about 10 concurrent requests
+MAX_CONCURRENT_REQUESTS = 10
+
+# QBO caps the length of query strings, so IN (...) filters are chunked
+QUERY_IN_CHUNK_SIZE = 30
+
+
+def _escape(value: str) -> str:
+    """Escape a value for use inside a quoted QBO query literal.
+
+    Backslashes are escaped first so a trailing or crafted backslash
+    can't terminate the literal early."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+@lru_cache(maxsize=1024)
+def _encode_query(query: str) -> str:
+    """URL-encode a query; repeated lookups skip the encoder"""
+    return quote(query, safe="")
+
+
+def _check_token(token: Token) -> None:
+    if not token.access_token or not token.realm_id:
+        raise Exception("QBO token not set")
+
 
 async def create_qbo(token: Token) -> "QBO":
-    qbo = QBO()
-    await qbo.set_token(token)
+    qbo = QBO(token)
+    try:
+        await qbo._set_preferences()
+    except Exception:
+        await qbo.close()
+        raise
     return qbo
 
 
 class QBO:
-    realm_id: str | None = None
-    access_token: str | None = None
+    realm_id: str
+    access_token: str
     home_currency: QBOCurrency | None = None
     using_sales_tax: bool = False
 
-    async def set_token(self, token: Token) -> None:
+    _QUERY_TEMPLATES = {
+        "tax_code_by_id": "select * from TaxCode where Id = '{}'",
+        "vendor_by_name": "select * from Vendor where DisplayName = '{}'",
+        "customer_by_name": "select * from Customer where DisplayName = '{}'",
+        "item_by_name": "select * from Item where Name = '{}'",
+        "account_by_name": "select * from Account where Name = '{}'",
+    }
+
+    def __init__(self, token: Token) -> None:
+        _check_token(token)
+        self.client: AsyncClient = qbo_client()
+        self._request_slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self._clear_caches()
+        self._use_token(token)
+
+    def _clear_caches(self) -> None:
+        self._tax_code_cache: Dict[str, Optional[TaxCode]] = {}
+        self._customer_cache: Dict[str, Optional[Customer]] = {}
+        # QBO names are case-insensitive, so items and accounts are keyed by
+        # the lowercased name; account keys also carry the currency
+        self._item_cache: Dict[str, Optional[ItemRef]] = {}
+        self._account_cache: Dict[Tuple[str, Optional[str]], Optional[str]] = {}
+
+    def _use_token(self, token: Token) -> None:
         self.realm_id = token.realm_id
         self.access_token = token.access_token
+        self.client.headers["Authorization"] = f"Bearer {token.access_token}"
+
+    async def set_token(self, token: Token) -> None:
+        _check_token(token)
+        if token.realm_id != self.realm_id:
+            self._clear_caches()
+        self._use_token(token)
         await self._set_preferences()
 
+    async def close(self) -> None:
+        await self.client.aclose()
+
     async def _request(
         self, path: str, method: str = "GET", body: Optional[Mapping[str, Any]] = None
-    ) -> Response:
-        if self.access_token is None or self.realm_id is None:
-            raise Exception("QBO token not set")
-
-        response = await qbo_request(
-            path=path,
-            method=method,
-            body=body,
-            access_token=self.access_token,
-            realm_id=self.realm_id,
-        )
-        return response
+    ) -> Dict[str, Any]:
+        async with self._request_slots:
+            return await qbo_request(
+                path=path,
+                method=method,
+                body=body,
+                realm_id=self.realm_id,
+                client=self.client,
+            )
 
-    async def _query(self, query: str) -> Response:
-        response = await self._request(f"/query?query={query}")
-        if "QueryResponse" not in response.json():
-            raise Exception(f"Query failed: {response.json()}")
-        return response
+    async def _query(self, query: str) -> Dict[str, Any]:
+        data = await self._request(f"/query?query={_encode_query(query)}")
+        if "QueryResponse" not in data:
+            raise Exception(f"Query failed: {data}")
+        return data
+
+    async def _query_template(self, template: str, value: str) -> Dict[str, Any]:
+        return await self._query(self._QUERY_TEMPLATES[template].format(_escape(value)))
+
+    async def _query_in(
+        self, entity: str, field: str, values: Iterable[str]
+    ) -> List[Dict[str, Any]]:
+        """Query all entities whose field matches any of values,
+        batching the values into as few queries as possible."""
+        unique_values = list(dict.fromkeys(values))
+        rows: List[Dict[str, Any]] = []
+        for i in range(0, len(unique_values), QUERY_IN_CHUNK_SIZE):
+            chunk = unique_values[i : i + QUERY_IN_CHUNK_SIZE]
+            in_list = ", ".join(f"'{_escape(value)}'" for value in chunk)
+            data = await self._query(
+                f"select * from {entity} where {field} in ({in_list})"
+            )
+            rows.extend(data["QueryResponse"].get(entity, []))
+        return rows
 
     async def _set_preferences(self) -> None:
-        response = await self._request(path="/preferences")
-        currency_prefs = response.json()["Preferences"]["CurrencyPrefs"]
-        tax_prefs = response.json()["Preferences"]["TaxPrefs"]
+        data = await self._request(path="/preferences")
+        currency_prefs = data["Preferences"]["CurrencyPrefs"]
+        tax_prefs = data["Preferences"]["TaxPrefs"]
 
         self.home_currency = currency_prefs["HomeCurrency"]["value"]
         self.using_sales_tax = tax_prefs["UsingSalesTax"]
@@ -66,20 +149,49 @@ class QBO:
         if self.home_currency == currency:
             return 1.0
 
-        response = await self._request(
+        data = await self._request(
             path=f"/exchangerate?sourcecurrencycode={currency}&asofdate={date}"
         )
-        return response.json()["ExchangeRate"]["Rate"]
+        return data["ExchangeRate"]["Rate"]
 
     async def get_tax_code(self, tax_code_id: str) -> Optional[TaxCode]:
-        response = await self._query(
-            f"select * from TaxCode where Id = '{tax_code_id}'"
+        if tax_code_id in self._tax_code_cache:
+            return self._tax_code_cache[tax_code_id]
+
+        data = await self._query_template("tax_code_by_id", tax_code_id)
+        tax_codes = data["QueryResponse"].get("TaxCode", [])
+        tax_code = TaxCode(**tax_codes[0]) if len(tax_codes) > 0 else None
+        self._tax_code_cache[tax_code_id] = tax_code
+        return tax_code
+
+    async def prefetch_tax_codes(self, tax_code_ids: Iterable[str]) -> None:
+        """Load tax codes into the cache with batched queries"""
+        tax_code_ids = [
+            tax_code_id
+            for tax_code_id in tax_code_ids
+            if tax_code_id not in self._tax_code_cache
+        ]
+        rows = await self._query_in("TaxCode", "Id", tax_code_ids)
+        tax_codes = {row["Id"]: TaxCode(**row) for row in rows}
+        for tax_code_id in tax_code_ids:
+            self._tax_code_cache[tax_code_id] = tax_codes.get(tax_code_id)
+
+    async def hydrate(
+        self,
+        item_names: Iterable[str] = (),
+        account_names: Iterable[str] = (),
+        tax_code_ids: Iterable[str] = (),
+    ) -> None:
+        """Prefetch the items, accounts and tax codes needed for a batch of
+        transactions, so that later lookups are served from the cache.
+
+        Anything missing from QBO is cached as absent and created on demand
+        by the get_or_create_* methods."""
+        await asyncio.gather(
+            self.prefetch_items(item_names),
+            self.prefetch_accounts(account_names),
+            self.prefetch_tax_codes(tax_code_ids),
         )
-        tax_codes = response.json()["QueryResponse"].get("TaxCode", [])
-        if len(tax_codes) == 0:
-            return None
-        else:
-            return TaxCode(**tax_codes[0])
 
     async def get_or_create_vendor(
         self, vendor_name: str, currency: Optional[QBOCurrency] = None
@@ -87,10 +199,8 @@ class QBO:
         if currency is None:
             currency = self.home_currency
 
-        response = await self._query(
-            f"select * from Vendor where DisplayName = '{vendor_name}'"
-        )
-        vendors = response.json()["QueryResponse"].get("Vendor", [])
+        data = await self._query_template("vendor_by_name", vendor_name)
+        vendors = data["QueryResponse"].get("Vendor", [])
         if len(vendors) > 0:
             if vendors[0]["CurrencyRef"]["value"] != currency:
                 # if already exists with different currency, create a new one
@@ -100,7 +210,7 @@ class QBO:
             else:
                 return vendors[0]["Id"]
 
-        response = await self._request(
+        data = await self._request(
             path="vendor",
             method="POST",
             body={
@@ -110,22 +220,22 @@ class QBO:
                 },
             },
         )
-        return response.json()["Vendor"]["Id"]
+        return data["Vendor"]["Id"]
 
     async def get_customer_by_name(self, customer_name: str) -> Optional[Customer]:
-        response = await self._query(
-            f"select * from Customer where DisplayName = '{customer_name}'"
-        )
-        customers = response.json()["QueryResponse"].get("Customer", [])
-        if len(customers) == 0:
-            return None
-        else:
-            return Customer(**customers[0])
+        if customer_name in self._customer_cache:
+            return self._customer_cache[customer_name]
+
+        data = await self._query_template("customer_by_name", customer_name)
+        customers = data["QueryResponse"].get("Customer", [])
+        customer = Customer.from_qbo(customers[0]) if len(customers) > 0 else None
+        self._customer_cache[customer_name] = customer
+        return customer
 
     async def create_customer(
         self, customer_name: str, currency: QBOCurrency
     ) -> Customer:
-        response = await self._request(
+        data = await self._request(
             path="customer",
             method="POST",
             body={
@@ -135,9 +245,11 @@ class QBO:
                 },
             },
         )
-        if "Customer" not in response.json():
-            raise Exception(f"Error creating customer: {response.json()}")
-        return Customer(**response.json()["Customer"])
+        if "Customer" not in data:
+            raise Exception(f"Error creating customer: {data}")
+        customer = Customer.from_qbo(data["Customer"])
+        self._customer_cache[customer_name] = customer
+        return customer
 
     async def get_or_create_customer(
         self, customer_name: str, currency: QBOCurrency
@@ -155,18 +267,36 @@ class QBO:
         return customer
 
     async def get_item_by_name(self, item_name: str) -> Optional[ItemRef]:
-        response = await self._query(f"select * from Item where Name = '{item_name}'")
-        items = response.json()["QueryResponse"].get("Item", [])
-        if len(items) == 0:
-            return None
-
-        return ItemRef(
-            value=items[0]["Id"],
-            name=items[0]["Name"],
+        if item_name.lower() in self._item_cache:
+            return self._item_cache[item_name.lower()]
+
+        data = await self._query_template("item_by_name", item_name)
+        items = data["QueryResponse"].get("Item", [])
+        item = (
+            ItemRef.model_construct(value=items[0]["Id"], name=items[0]["Name"])
+            if len(items) > 0
+            else None
         )
+        self._item_cache[item_name.lower()] = item
+        return item
+
+    async def prefetch_items(self, item_names: Iterable[str]) -> None:
+        """Load items into the cache with batched queries"""
+        item_names = [
+            name for name in item_names if name.lower() not in self._item_cache
+        ]
+        rows = await self._query_in("Item", "Name", item_names)
+        items = {
+            row["Name"].lower(): ItemRef.model_construct(
+                value=row["Id"], name=row["Name"]
+            )
+            for row in rows
+        }
+        for name in item_names:
+            self._item_cache[name.lower()] = items.get(name.lower())
 
     async def create_item(self, item_name: str, account_id: str) -> ItemRef:
-        response = await self._request(
+        data = await self._request(
             path="item",
             method="POST",
             body={
@@ -178,10 +308,12 @@ class QBO:
             },
         )
 
-        return ItemRef(
-            value=response.json()["Item"]["Id"],
-            name=response.json()["Item"]["Name"],
+        item = ItemRef.model_construct(
+            value=data["Item"]["Id"],
+            name=data["Item"]["Name"],
         )
+        self._item_cache[item_name.lower()] = item
+        return item
 
     async def get_or_create_item(self, item_name: str, account_id: str) -> ItemRef:
         item = await self.get_item_by_name(item_name)
@@ -205,28 +337,51 @@ class QBO:
         }
         if account_sub_type is not None:
             body["AccountSubType"] = account_sub_type
-        response = await self._request(path="/account", body=body, method="POST")
-        return response.json()["Account"]["Id"]
+        data = await self._request(path="/account", body=body, method="POST")
+        account_id = data["Account"]["Id"]
+        self._account_cache[
+            (account_name.lower(), currency or self.home_currency)
+        ] = account_id
+        return account_id
 
     async def get_account_id(
         self, account_name: str, currency: Optional[QBOCurrency] = None
     ) -> Optional[str]:
         if currency is None:
             currency = self.home_currency
+        if (account_name.lower(), currency) in self._account_cache:
+            return self._account_cache[(account_name.lower(), currency)]
 
-        response = await self._query(
-            f"select * from Account where Name = '{account_name}'"
-        )
-        accounts = response.json()["QueryResponse"].get("Account", [])
+        data = await self._query_template("account_by_name", account_name)
+        accounts = data["QueryResponse"].get("Account", [])
         accounts = [
             account
             for account in accounts
             if account["CurrencyRef"]["value"] == currency
         ]
-        if len(accounts) == 0:
-            return None
+        account_id = accounts[0]["Id"] if len(accounts) > 0 else None
+        self._account_cache[(account_name.lower(), currency)] = account_id
+        return account_id
+
+    async def prefetch_accounts(
+        self, account_names: Iterable[str], currency: Optional[QBOCurrency] = None
+    ) -> None:
+        """Load account ids into the cache with batched queries"""
+        if currency is None:
+            currency = self.home_currency
 
-        return accounts[0]["Id"]
+        account_names = [
+            name
+            for name in account_names
+            if (name.lower(), currency) not in self._account_cache
+        ]
+        rows = await self._query_in("Account", "Name", account_names)
+        accounts: Dict[str, str] = {}
+        for row in rows:
+            if row["CurrencyRef"]["value"] == currency:
+                accounts.setdefault(row["Name"].lower(), row["Id"])
+        for name in account_names:
+            self._account_cache[(name.lower(), currency)] = accounts.get(name.lower())
 
     async def get_or_create_account(
         self,
@@ -248,31 +403,76 @@ class QBO:
         )
 
     async def create_invoice(self, invoice: Invoice) -> str:
-        response = await self._request(
+        data = await self._request(
             path="invoice",
             method="POST",
-            body=invoice.model_dump(),
+            # Unset optional fields (e.g. line descriptions) don't need to be sent
+            body=invoice.model_dump(exclude_none=True),
         )
-        return response.json()["Invoice"]["Id"]
+        return data["Invoice"]["Id"]
 
     async def create_payment(
         self,
         payment: Payment,
     ) -> str:
         # TODO: Payment method?
-        response = await self._request(
+        data = await self._request(
             path="/payment", body=payment.model_dump(), method="POST"
         )
-        return response.json()["Payment"]["Id"]
+        return data["Payment"]["Id"]
 
     async def create_expense(self, expense: Expense) -> str:
-        response = await self._request(
+        data = await self._request(
             path="/purchase", body=expense.model_dump(), method="POST"
         )
-        return response.json()["Purchase"]["Id"]
+        return data["Purchase"]["Id"]
 
     async def create_transfer(self, transfer: Transfer) -> str:
-        response = await self._request(
+        data = await self._request(
             path="/transfer", body=transfer.model_dump(), method="POST"
         )
-        return response.json()["Transfer"]["Id"]
+        return data["Transfer"]["Id"]
+
+    async def batch_create(
+        self, entities: Sequence[Tuple[str, BaseModel]]
+    ) -> List[str | QBOException]:
+        """Create several independent entities with a single batch request.
+
+        QBO batch operations cannot reference each other's results, so only
+        entities that don't depend on one another can be combined. Each item
+        succeeds or fails on its own, so a failed item's error is returned in
+        its place rather than raised, keeping the ids of the items created.
+
+        Args:
+            entities: (entity type, model) pairs, e.g. ("Payment", payment)
+
+        Returns:
+            List[str | QBOException]: id of each created entity, or the error
+                QBO returned for it, in the same order"""
+        if len(entities) == 0:
+            return []
+
+        data = await self._request(
+            path="batch",
+            method="POST",
+            body={
+                "BatchItemRequest": [
+                    {
+                        "bId": str(i),
+                        "operation": "create",
+                        entity_type: model.model_dump(),
+                    }
+                    for i, (entity_type, model) in enumerate(entities)
+                ]
+            },
+        )
+        items = {item["bId"]: item for item in data["BatchItemResponse"]}
+
+        results: List[str | QBOException] = []
+        for i, (entity_type, _) in enumerate(entities):
+            item = items[str(i)]
+            if "Fault" in item:
+                results.append(QBOException(item["Fault"]["Error"][0]["Detail"]))
+            else:
+                results.append(item[entity_type]["Id"])
+        return results
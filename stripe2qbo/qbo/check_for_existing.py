@@ -8,7 +8,8 @@ async def check_for_existing(
     qbo_customer_id: Optional[str] = None,
     date_string: Optional[str] = None,
     private_note: Optional[str] = None,
-    qbo: QBO = QBO(),
+    *,
+    qbo: QBO,
 ) -> Optional[str]:
     """Query QBO for an object of type object_type.
 
@@ -25,8 +26,8 @@ async def check_for_existing(
     if len(filters) > 0:
         filter_string = "where " + " and ".join(filters)
 
-    response = await qbo._query(f"select * from {object_type} {filter_string}")
-    qbo_items = response.json()["QueryResponse"].get(object_type, [])
+    data = await qbo._query(f"select * from {object_type} {filter_string}")
+    qbo_items = data["QueryResponse"].get(object_type, [])
 
     # Cannot query by PrivateNote, so we filter the returned items
     if private_note is not None:
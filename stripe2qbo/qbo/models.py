@@ -1,6 +1,7 @@
-from typing import List, Optional, Literal
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 QBOCurrency = Literal["USD", "CAD"]
@@ -19,16 +20,34 @@ class ItemRef(BaseModel):
     value: str
     name: Optional[str] = None
 
+    model_config = ConfigDict(frozen=True)
+
 
 class TaxCodeRef(BaseModel):
     value: str
 
+    model_config = ConfigDict(frozen=True)
+
+
+@dataclass(frozen=True, slots=True)
+class Customer:
+    """Read-only view of a QBO Customer.
+
+    Customers are only ever read from trusted QBO responses, so this skips
+    pydantic validation."""
 
-class Customer(BaseModel):
     DisplayName: str
     Id: str
     CurrencyRef: CurrencyRef
 
+    @classmethod
+    def from_qbo(cls, data: Dict[str, Any]) -> "Customer":
+        return cls(
+            DisplayName=data["DisplayName"],
+            Id=data["Id"],
+            CurrencyRef=CurrencyRef.model_construct(value=data["CurrencyRef"]["value"]),
+        )
+
 
 class TaxRateDetail(BaseModel):
     TaxRateRef: ItemRef
@@ -99,6 +118,8 @@ class ProductItemRef(BaseModel):
     value: Optional[str] = None
     name: Optional[str] = None
 
+    model_config = ConfigDict(frozen=True)
+
 
 class SalesItemLineDetail(BaseModel):
     ItemRef: ProductItemRef
@@ -1,42 +1,63 @@
-from typing import Any, Optional, Mapping
+from typing import Any, Dict, Optional, Mapping
 import os
 from dotenv import load_dotenv
 
 import httpx
-from httpx import Response
+import orjson
 
 from stripe2qbo.exceptions import QBOException
 
 load_dotenv()
 
 
+def qbo_client(access_token: Optional[str] = None) -> httpx.AsyncClient:
+    """Create a pooled client for QBO requests.
+
+    Keeping one client around lets consecutive requests reuse the same
+    TCP/TLS connection instead of opening a new one for every call, and
+    HTTP/2 lets concurrent requests share that connection."""
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    }
+    if access_token is not None:
+        headers["Authorization"] = f"Bearer {access_token}"
+
+    # limits/http2 must be set on the transport when passing one explicitly
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=30.0,
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            retries=3,
+        ),
+    )
+
+
 async def qbo_request(
     path: str,
     method: str = "GET",
     body: Optional[Mapping[str, Any]] = None,
-    access_token: str = "",
     realm_id: str = "",
-) -> Response:
-    if access_token == "":
-        raise Exception("No access token provided")
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.request(
-                method,
-                url=f"{os.getenv('QBO_BASE_URL', '')}/{realm_id}/{path}",
-                headers={
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {access_token}",
-                },
-                json=body,
-            )
-        except Exception as e:
-            raise Exception(f"Error making request: {e}")
+    *,
+    client: httpx.AsyncClient,
+) -> Dict[str, Any]:
+    """Make a request against the QBO API.
+
+    The client (see qbo_client) carries the Authorization header."""
+    try:
+        response = await client.request(
+            method,
+            url=f"{os.getenv('QBO_BASE_URL', '')}/{realm_id}/{path}",
+            content=orjson.dumps(body) if body is not None else None,
+        )
+    except Exception as e:
+        raise Exception(f"Error making request: {e}")
 
     # TODO: get intuit_tid from response headers and log it
-    if "Fault" in response.json():
-        raise QBOException(response.json()["Fault"]["Error"][0]["Detail"])
+    payload = orjson.loads(response.content)
+    if "Fault" in payload:
+        raise QBOException(payload["Fault"]["Error"][0]["Detail"])
 
-    return response
+    return payload
@@ -1,4 +1,5 @@
 from typing import Dict, cast, Optional
+from functools import lru_cache
 import datetime
 
 from stripe2qbo.db.schemas import Settings
@@ -6,8 +7,25 @@ import stripe2qbo.qbo.models as qbo_models
 import stripe2qbo.stripe.models as stripe_models
 
 
-def _timestamp_to_date(timestamp: int) -> datetime.datetime:
-    return datetime.datetime.fromtimestamp(timestamp)
+def _timestamp_to_date_string(timestamp: int) -> str:
+    """Format a Unix timestamp as a QBO date string (YYYY-MM-DD)"""
+    return datetime.date.fromtimestamp(timestamp).isoformat()
+
+
+# Refs are immutable and repeat across most transactions, so share instances
+@lru_cache(maxsize=1024)
+def _item_ref(value: str, name: Optional[str] = None) -> qbo_models.ItemRef:
+    return qbo_models.ItemRef(value=value, name=name)
+
+
+@lru_cache(maxsize=1024)
+def _product_item_ref(name: str) -> qbo_models.ProductItemRef:
+    return qbo_models.ProductItemRef(name=name)
+
+
+@lru_cache(maxsize=1024)
+def _tax_code_ref(value: str) -> qbo_models.TaxCodeRef:
+    return qbo_models.TaxCodeRef(value=value)
 
 
 def transfer_from_payout(
@@ -24,10 +42,10 @@ def transfer_from_payout(
 
     return qbo_models.Transfer(
         Amount=amount / 100,
-        FromAccountRef=qbo_models.ItemRef(value=from_account),
-        ToAccountRef=qbo_models.ItemRef(value=to_account),
+        FromAccountRef=_item_ref(from_account),
+        ToAccountRef=_item_ref(to_account),
         # TODO: use arrival date?
-        TxnDate=_timestamp_to_date(payout.created).strftime("%Y-%m-%d"),
+        TxnDate=_timestamp_to_date_string(payout.created),
         PrivateNote=f"{payout.description}\n{payout.id}",
     )
 
@@ -52,9 +70,9 @@ def expense_from_transaction(
         TotalAmt=amount,
         ExchangeRate=transaction.exchange_rate or 1.0,
         CurrencyRef=qbo_models.CurrencyRef(value=currency),
-        AccountRef=qbo_models.ItemRef(value=account_id),
-        EntityRef=qbo_models.ItemRef(value=vendor_id),
-        TxnDate=_timestamp_to_date(transaction.created).strftime("%Y-%m-%d"),
+        AccountRef=_item_ref(account_id),
+        EntityRef=_item_ref(vendor_id),
+        TxnDate=_timestamp_to_date_string(transaction.created),
         PrivateNote=f"""
             {description}
             {transaction.id}
@@ -64,7 +82,7 @@ def expense_from_transaction(
             qbo_models.ExpenseLine(
                 Amount=amount,
                 AccountBasedExpenseLineDetail=qbo_models.AccountBasedExpenseLineDetail(
-                    AccountRef=qbo_models.ItemRef(value=settings.stripe_fee_account_id),
+                    AccountRef=_item_ref(settings.stripe_fee_account_id),
                 ),
                 Description=transaction.description,
             )
@@ -81,16 +99,14 @@ def qbo_invoice_line_from_stripe_invoice_line(
     else:
         tax_code_id = settings.exempt_tax_code_id
 
-    product = qbo_models.ProductItemRef(
-        name=line.product.name,
-    )
+    product = _product_item_ref(line.product.name)
 
     return qbo_models.InvoiceLine(
         Amount=line.amount / 100,
         Description=line.description,
         SalesItemLineDetail=qbo_models.SalesItemLineDetail(
             ItemRef=product,
-            TaxCodeRef=qbo_models.TaxCodeRef(value=tax_code_id),
+            TaxCodeRef=_tax_code_ref(tax_code_id),
         ),
     )
 
@@ -188,21 +204,21 @@ def qbo_invoice_from_stripe_invoice(
     tax_detail = tax_detail_from_invoice(invoice, tax_codes, settings)
 
     qbo_invoice = qbo_models.Invoice(
-        CustomerRef=qbo_models.ItemRef(value=customer_id),
+        CustomerRef=_item_ref(customer_id),
         CurrencyRef={
             "value": invoice.currency.upper(),  # type: ignore
         },
         ExchangeRate=exchange_rate,
-        TxnDate=_timestamp_to_date(invoice.created).strftime("%Y-%m-%d"),
+        TxnDate=_timestamp_to_date_string(invoice.created),
+        DueDate=(
+            _timestamp_to_date_string(invoice.due_date) if invoice.due_date else None
+        ),
         Line=invoice_lines,
         DocNumber=invoice.number,
         PrivateNote=f"{invoice.number}\n{invoice.id}",
         TxnTaxDetail=tax_detail,
     )
 
-    if invoice.due_date:
-        qbo_invoice.DueDate = _timestamp_to_date(invoice.due_date).strftime("%Y-%m-%d")
-
     return qbo_invoice
 
 
@@ -218,11 +234,9 @@ def payment_from_charge(
     payment = qbo_models.Payment(
         TotalAmt=charge.amount / 100,
         CurrencyRef=qbo_models.CurrencyRef(value=currency),
-        CustomerRef=qbo_models.ItemRef(value=customer_id),
-        DepositToAccountRef=qbo_models.ItemRef(
-            value=settings.stripe_clearing_account_id
-        ),
-        TxnDate=_timestamp_to_date(charge.created).strftime("%Y-%m-%d"),
+        CustomerRef=_item_ref(customer_id),
+        DepositToAccountRef=_item_ref(settings.stripe_clearing_account_id),
+        TxnDate=_timestamp_to_date_string(charge.created),
         PrivateNote=f"{charge.description}\n{charge.id}",
         ExchangeRate=cast(float, exchange_rate),
     )
@@ -1,6 +1,6 @@
 import os
-import json
 from datetime import datetime
+from typing import AsyncGenerator
 
 import pytest
 import stripe
@@ -49,14 +49,12 @@ def test_token() -> Token:
     Returns:
         Token: QBO token
     """
-    if os.path.exists("test_token.json"):
-        with open("test_token.json") as f:
-            token = json.load(f)
-            token = Token(**token)
-            if datetime.fromisoformat(token.expires_at) < datetime.now():
-                token = refresh_auth_token(token.refresh_token, token.realm_id)
-
-    else:
+    try:
+        with open("test_token.json", "rb") as f:
+            token = Token.model_validate_json(f.read())
+        if datetime.fromisoformat(token.expires_at) < datetime.now():
+            token = refresh_auth_token(token.refresh_token, token.realm_id)
+    except FileNotFoundError:
         auth_url = get_auth_url()
         print(f"Please visit {auth_url} and fill in the prompts below.")
         code = input("Code: ")
@@ -64,7 +62,7 @@ def test_token() -> Token:
         token = generate_auth_token(code, realm_id)
 
     with open("test_token.json", "w") as f:
-        json.dump(token.model_dump(), f)
+        f.write(token.model_dump_json())
 
     return token
 
@@ -83,12 +81,15 @@ def test_user(test_token: Token) -> User:
 
 
 @pytest.fixture
-async def test_qbo(test_token: Token) -> QBO:
+async def test_qbo(test_token: Token) -> AsyncGenerator[QBO, None]:
     qbo = await create_qbo(test_token)
     assert qbo.access_token is not None
     assert qbo.realm_id is not None
     assert qbo.home_currency is not None
-    return qbo
+
+    yield qbo
+
+    await qbo.close()
 
 
 @pytest.fixture
@@ -1,17 +1,20 @@
-from typing import Dict, cast
+from typing import Any, Dict, List, cast
 from datetime import datetime
 import os
 
+import pytest
 from dotenv import load_dotenv
 import stripe
 
 from stripe2qbo.db.schemas import Settings
 from stripe2qbo.qbo.auth import Token
-from stripe2qbo.qbo.QBO import QBO
+from stripe2qbo.qbo.QBO import QBO, QUERY_IN_CHUNK_SIZE
+from stripe2qbo.exceptions import QBOException
 from stripe2qbo.qbo.models import ProductItemRef, QBOCurrency, TaxCode
 from stripe2qbo.stripe.models import Transaction
 from stripe2qbo.sync_helpers import (
     expense_from_transaction,
+    payment_from_charge,
     qbo_invoice_from_stripe_invoice,
 )
 
@@ -22,26 +25,38 @@ ACCOUNT_ID = os.getenv("TEST_STRIPE_ACCOUNT_ID", "")
 
 
 async def test_qbo_request(test_qbo: QBO, test_token: Token):
-    response = await test_qbo._request(
+    data = await test_qbo._request(
         path=f"/companyinfo/{test_token.realm_id}",
     )
 
-    assert response.status_code == 200
-    assert response.json()["CompanyInfo"]["CompanyName"] is not None
-    assert response.json()["CompanyInfo"]["Country"] is not None
+    assert data["CompanyInfo"]["CompanyName"] is not None
+    assert data["CompanyInfo"]["Country"] is not None
 
 
 async def test_create_account(test_qbo: QBO):
     account_id = await test_qbo.get_or_create_account("Test Expense Account", "Expense")
 
-    response = await test_qbo._request(path=f"/account/{account_id}")
+    data = await test_qbo._request(path=f"/account/{account_id}")
 
-    assert response.status_code == 200
+    assert data["Account"]["Id"] == account_id
+    assert data["Account"]["Name"] == "Test Expense Account"
+    assert data["Account"]["AccountType"] == "Expense"
+    assert data["Account"]["CurrencyRef"]["value"] == test_qbo.home_currency
 
-    assert response.json()["Account"]["Id"] == account_id
-    assert response.json()["Account"]["Name"] == "Test Expense Account"
-    assert response.json()["Account"]["AccountType"] == "Expense"
-    assert response.json()["Account"]["CurrencyRef"]["value"] == test_qbo.home_currency
+
+async def test_customer_name_with_special_characters(test_qbo: QBO):
+    name = "O'Brien & Co"
+    currency = cast(QBOCurrency, test_qbo.home_currency)
+    customer = await test_qbo.get_or_create_customer(name, currency)
+
+    assert customer.DisplayName == name
+
+    # Look the customer up from QBO again rather than from the cache
+    test_qbo._clear_caches()
+    found = await test_qbo.get_customer_by_name(name)
+
+    assert found is not None
+    assert found.Id == customer.Id
 
 
 async def test_create_expense(
@@ -55,9 +70,8 @@ async def test_create_expense(
     expense = expense_from_transaction(test_charge_transaction, test_settings)
     expense_id = await test_qbo.create_expense(expense)
 
-    response = await test_qbo._request(path=f"/purchase/{expense_id}")
-    assert response.status_code == 200
-    purchase = response.json()["Purchase"]
+    data = await test_qbo._request(path=f"/purchase/{expense_id}")
+    purchase = data["Purchase"]
 
     assert purchase is not None
     assert purchase["Id"] == expense_id
@@ -71,6 +85,59 @@ async def test_create_expense(
     assert purchase["AccountRef"]["value"] == test_settings.stripe_clearing_account_id
 
 
+async def test_batch_create(
+    test_qbo: QBO,
+    test_settings: Settings,
+    test_charge_transaction: Transaction,
+):
+    assert test_charge_transaction.charge is not None
+    currency = cast(QBOCurrency, test_charge_transaction.currency.upper())
+    customer = await test_qbo.get_or_create_customer("Stripe customer", currency)
+
+    payment = payment_from_charge(
+        test_charge_transaction.charge,
+        customer.Id,
+        test_settings,
+        exchange_rate=test_charge_transaction.exchange_rate or 1.0,
+    )
+    expense = expense_from_transaction(test_charge_transaction, test_settings)
+    payment_id, expense_id = await test_qbo.batch_create(
+        [("Payment", payment), ("Purchase", expense)]
+    )
+    assert isinstance(payment_id, str)
+    assert isinstance(expense_id, str)
+
+    data = await test_qbo._request(path=f"/payment/{payment_id}")
+    assert data["Payment"]["Id"] == payment_id
+    assert data["Payment"]["CustomerRef"]["value"] == customer.Id
+    assert data["Payment"]["TotalAmt"] == test_charge_transaction.charge.amount / 100
+
+    data = await test_qbo._request(path=f"/purchase/{expense_id}")
+    assert data["Purchase"]["Id"] == expense_id
+    assert data["Purchase"]["TotalAmt"] == test_charge_transaction.fee / 100
+
+
+async def test_batch_create_partial_failure(
+    test_qbo: QBO,
+    test_settings: Settings,
+    test_charge_transaction: Transaction,
+):
+    assert test_charge_transaction.charge is not None
+
+    # A payment for a customer that doesn't exist fails on its own
+    payment = payment_from_charge(test_charge_transaction.charge, "0", test_settings)
+    expense = expense_from_transaction(test_charge_transaction, test_settings)
+    payment_result, expense_id = await test_qbo.batch_create(
+        [("Payment", payment), ("Purchase", expense)]
+    )
+
+    assert isinstance(payment_result, QBOException)
+    assert isinstance(expense_id, str)
+
+    data = await test_qbo._request(path=f"/purchase/{expense_id}")
+    assert data["Purchase"]["Id"] == expense_id
+
+
 async def test_create_invoice(
     test_qbo: QBO, test_invoice_transaction: Transaction, test_settings: Settings
 ):
@@ -115,11 +182,9 @@ async def test_create_invoice(
 
     assert invoice_id is not None
 
-    response = await test_qbo._request(path=f"/invoice/{invoice_id}")
-
-    assert response.status_code == 200
+    data = await test_qbo._request(path=f"/invoice/{invoice_id}")
 
-    invoice = response.json()["Invoice"]
+    invoice = data["Invoice"]
 
     assert invoice is not None
     assert invoice["Id"] == invoice_id
@@ -138,3 +203,68 @@ async def test_create_invoice(
         == f"{test_invoice_transaction.invoice.number}\n{test_invoice_transaction.invoice.id}"  # noqa
     )
     assert len(invoice["Line"]) == len(test_invoice_transaction.invoice.lines) + 1
+
+
+def _offline_qbo() -> QBO:
+    return QBO(
+        Token(
+            realm_id="1",
+            access_token="access-token",
+            expires_at="",
+            refresh_token="",
+            refresh_token_expires_at="",
+        )
+    )
+
+
+async def test_query_in_chunks_and_escapes(monkeypatch: pytest.MonkeyPatch):
+    qbo = _offline_qbo()
+    queries: List[str] = []
+
+    async def fake_query(query: str) -> Dict[str, Any]:
+        queries.append(query)
+        return {"QueryResponse": {"Item": [{"Id": str(len(queries))}]}}
+
+    monkeypatch.setattr(qbo, "_query", fake_query)
+
+    names = [f"Item {i}" for i in range(QUERY_IN_CHUNK_SIZE * 2)]
+    tricky = ["O'Brien", "Acme\\", "x\\' or Id > '0"]
+    rows = await qbo._query_in("Item", "Name", names + tricky + ["Item 0"])
+    await qbo.close()
+
+    # 60 names fill two chunks, the quoted names go in a third
+    assert len(queries) == 3
+    assert rows == [{"Id": "1"}, {"Id": "2"}, {"Id": "3"}]
+    assert queries[0] == (
+        "select * from Item where Name in ("
+        + ", ".join(f"'{name}'" for name in names[:QUERY_IN_CHUNK_SIZE])
+        + ")"
+    )
+    # backslashes are escaped so no value can close its literal early
+    assert queries[2] == (
+        "select * from Item where Name in "
+        "('O\\'Brien', 'Acme\\\\', 'x\\\\\\' or Id > \\'0')"
+    )
+    # duplicate names are only queried once
+    assert sum(query.count("'Item 0'") for query in queries) == 1
+
+
+async def test_item_and_account_caches_ignore_case(monkeypatch: pytest.MonkeyPatch):
+    qbo = _offline_qbo()
+    qbo.home_currency = "USD"
+    queries: List[str] = []
+
+    async def fake_query(query: str) -> Dict[str, Any]:
+        queries.append(query)
+        return {"QueryResponse": {}}
+
+    monkeypatch.setattr(qbo, "_query", fake_query)
+
+    await qbo.hydrate(item_names=["Pro Plan"], account_names=["Pro Plan"])
+    assert len(queries) == 2
+
+    # names differing only in case are served from the same cache entries
+    assert await qbo.get_item_by_name("pro plan") is None
+    assert await qbo.get_account_id("PRO PLAN") is None
+    assert len(queries) == 2
+    await qbo.close()
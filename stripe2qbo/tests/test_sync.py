@@ -10,7 +10,6 @@ from stripe2qbo.qbo.QBO import QBO
 from stripe2qbo.qbo.auth import Token
 from stripe2qbo.stripe.stripe_transactions import build_transaction
 from stripe2qbo.stripe.models import Transaction
-from stripe2qbo.qbo.qbo_request import qbo_request
 from stripe2qbo.db.models import User
 from stripe2qbo.Stripe2QBO import create_stripe2qbo
 
@@ -23,7 +22,9 @@ ACCOUNT_ID = os.getenv("TEST_STRIPE_ACCOUNT_ID", "")
 @pytest.mark.skip(
     reason="Esure that the test Stripe account has a payout or available balance"
 )
-async def test_sync_payout(test_token: Token, test_user: User, test_settings: Settings):
+async def test_sync_payout(
+    test_token: Token, test_user: User, test_settings: Settings, test_qbo: QBO
+):
     txn = stripe.BalanceTransaction.list(
         limit=1, type="payout", stripe_account=ACCOUNT_ID, expand=["data.source"]
     ).data[0]
@@ -32,46 +33,44 @@ async def test_sync_payout(test_token: Token, test_user: User, test_settings: Se
     assert transaction.payout is not None
 
     syncer = await create_stripe2qbo(test_settings, test_token)
-    sync = await syncer.sync(transaction, test_user)
+    try:
+        sync = await syncer.sync(transaction, test_user)
+    finally:
+        await syncer.close()
 
     assert sync.status == "success"
     assert sync.transfer_id is not None
     assert sync.id == transaction.id
 
-    response = await qbo_request(
-        path=f"/transfer/{sync.transfer_id}",
-        access_token=test_token.access_token,
-        realm_id=test_token.realm_id,
-    )
+    data = await test_qbo._request(path=f"/transfer/{sync.transfer_id}")
 
-    assert response.status_code == 200
-    assert response.json()["Transfer"]["Id"] == sync.transfer_id
-    assert response.json()["Transfer"]["TxnDate"] == datetime.fromtimestamp(
+    assert data["Transfer"]["Id"] == sync.transfer_id
+    assert data["Transfer"]["TxnDate"] == datetime.fromtimestamp(
         transaction.created
     ).strftime("%Y-%m-%d")
     assert (
-        response.json()["Transfer"]["PrivateNote"]
+        data["Transfer"]["PrivateNote"]
         == f"{transaction.payout.description}\n{transaction.payout.id}"
     )
 
     if transaction.payout.amount > 0:
-        assert response.json()["Transfer"]["Amount"] == transaction.payout.amount / 100
+        assert data["Transfer"]["Amount"] == transaction.payout.amount / 100
         assert (
-            response.json()["Transfer"]["FromAccountRef"]["value"]
+            data["Transfer"]["FromAccountRef"]["value"]
             == test_settings.stripe_clearing_account_id
         )
         assert (
-            response.json()["Transfer"]["ToAccountRef"]["value"]
+            data["Transfer"]["ToAccountRef"]["value"]
             == test_settings.stripe_payout_account_id
         )
     else:
-        assert response.json()["Transfer"]["Amount"] == -transaction.payout.amount / 100
+        assert data["Transfer"]["Amount"] == -transaction.payout.amount / 100
         assert (
-            response.json()["Transfer"]["FromAccountRef"]["value"]
+            data["Transfer"]["FromAccountRef"]["value"]
             == test_settings.stripe_payout_account_id
         )
         assert (
-            response.json()["Transfer"]["ToAccountRef"]["value"]
+            data["Transfer"]["ToAccountRef"]["value"]
             == test_settings.stripe_clearing_account_id
         )
 
@@ -91,7 +90,10 @@ async def test_sync_invoice(
     invoice_currency = transaction.invoice.currency.upper()
 
     syncer = await create_stripe2qbo(test_settings, test_token)
-    sync = await syncer.sync(transaction, test_user)
+    try:
+        sync = await syncer.sync(transaction, test_user)
+    finally:
+        await syncer.close()
 
     assert sync.status == "success"
     assert sync.id == transaction.id
@@ -99,14 +101,8 @@ async def test_sync_invoice(
     assert sync.payment_id is not None
     assert sync.expense_id is not None
 
-    response = await qbo_request(
-        path=f"/invoice/{sync.invoice_id}",
-        access_token=test_token.access_token,
-        realm_id=test_token.realm_id,
-    )
-    assert response.status_code == 200
-
-    invoice = response.json()["Invoice"]
+    data = await test_qbo._request(path=f"/invoice/{sync.invoice_id}")
+    invoice = data["Invoice"]
     assert invoice is not None
     assert invoice["Id"] == sync.invoice_id
     assert invoice["TxnDate"] == datetime.fromtimestamp(transaction.created).strftime(
@@ -137,14 +133,9 @@ async def test_sync_invoice(
     if test_qbo.using_sales_tax:
         assert invoice["TxnTaxDetail"]["TotalTax"] == 0
 
-    response = await qbo_request(
-        path=f"/payment/{sync.payment_id}",
-        access_token=test_token.access_token,
-        realm_id=test_token.realm_id,
-    )
+    data = await test_qbo._request(path=f"/payment/{sync.payment_id}")
 
-    assert response.status_code == 200
-    payment = response.json()["Payment"]
+    payment = data["Payment"]
     assert payment is not None
     assert payment["Id"] == sync.payment_id
     assert payment["TxnDate"] == datetime.fromtimestamp(
@@ -167,14 +158,9 @@ async def test_sync_invoice(
     assert payment["Line"][0]["Amount"] == transaction.charge.amount / 100
     assert payment["Line"][0]["LinkedTxn"][0]["TxnId"] == sync.invoice_id
 
-    response = await qbo_request(
-        path=f"/purchase/{sync.expense_id}",
-        access_token=test_token.access_token,
-        realm_id=test_token.realm_id,
-    )
+    data = await test_qbo._request(path=f"/purchase/{sync.expense_id}")
 
-    assert response.status_code == 200
-    expense = response.json()["Purchase"]
+    expense = data["Purchase"]
     assert expense is not None
     assert expense["Id"] == sync.expense_id
     assert expense["TxnDate"] == datetime.fromtimestamp(
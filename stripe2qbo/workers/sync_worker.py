@@ -48,8 +48,11 @@ async def sync_transaction(transaction_id: str, user_id: int):
         raise Exception("Stripe user id is not set")
 
     syncer = await create_stripe2qbo(settings, qbo_token)
-    transaction = get_transaction(transaction_id, account_id=user.stripe_user_id)
-    transaction_sync = await syncer.sync(transaction, user)
+    try:
+        transaction = get_transaction(transaction_id, account_id=user.stripe_user_id)
+        transaction_sync = await syncer.sync(transaction, user)
+    finally:
+        await syncer.close()
 
     db.query(TransactionSync).filter(TransactionSync.id == transaction_id).update(
         {